@@ -6,23 +6,52 @@ using the Apertus 8B Swiss sovereign LLM via HuggingFace Inference API.
 """
 
 import os
+import json
 import time
+import queue
+import pickle
+import hashlib
 import logging
-from typing import List, Dict, Tuple, Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from typing import List, Dict, Tuple, Optional, Iterator, Callable
+from collections import OrderedDict
 from dataclasses import dataclass
 
 import gradio as gr
 import numpy as np
 import requests
-from scipy.spatial.distance import cosine
-from huggingface_hub import InferenceClient
+import orjson
+import diskcache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tokenizers import Tokenizer
 from openai import OpenAI
 import fitz  # PyMuPDF
 
+try:
+    import simsimd  # Optional SIMD similarity kernels
+except ImportError:
+    simsimd = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Shared HTTP session: pooled keep-alive connections and retries for all outgoing requests
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=None  # Feature extraction POSTs are safe to retry
+    )
+))
+
 # Document configuration
 DOCUMENTS = [
     {
@@ -41,23 +70,76 @@ DOCUMENTS = [
 
 # Model configuration
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+HF_FEATURE_EXTRACTION_URL = "https://router.huggingface.co/hf-inference/models/{model}/pipeline/feature-extraction"
 LLM_MODEL = "swiss-ai/apertus-8b-instruct"   # PublicAI model name
 PUBLICAI_BASE_URL = "https://api.publicai.co/v1"
 
-# Chunking parameters
+# Cache configuration
+CACHE_DIR = os.environ.get("SWISSRAG_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "swissrag"))
+EMBEDDING_CACHE_DIR = os.path.join(CACHE_DIR, "embeddings")
+INDEX_CACHE_DIR = os.path.join(CACHE_DIR, "index")
+# Bump whenever text extraction, chunking or quantization changes so existing
+# index snapshots are rebuilt instead of silently reused
+INDEX_FORMAT_VERSION = 2
+PDF_CACHE_DIR = os.path.join(CACHE_DIR, "pdfs")
+EMBEDDING_MEMO_SIZE = 2048
+ANSWER_CACHE_SIZE = 256
+
+# Embedding request parameters
+EMBEDDING_WORKERS = 8
+EMBEDDING_REQUESTS_PER_SECOND = 4.0
+
+# Query embedding micro-batching: concurrent queries arriving within this window
+# are embedded with one API request
+QUERY_BATCH_MAX_WAIT_MS = 20
+QUERY_BATCH_MAX_SIZE = 32
+
+# Number of queries the UI handles concurrently
+UI_CONCURRENCY_LIMIT = 8
+
+# Chunking parameters (tokens of the embedding model's tokenizer). The model
+# truncates at 256 word pieces including [CLS]/[SEP], so windows hold at most 254.
+CHUNK_SIZE_TOKENS = 254
+OVERLAP_TOKENS = 64
+CHUNK_STRIDE_TOKENS = CHUNK_SIZE_TOKENS - OVERLAP_TOKENS
+assert 0 < CHUNK_STRIDE_TOKENS < CHUNK_SIZE_TOKENS, "Chunk overlap must be positive and smaller than chunk size"
+
+# Character approximation, used only if the tokenizer cannot be loaded
 CHARS_PER_TOKEN = 4
-CHUNK_SIZE_TOKENS = 400
-OVERLAP_TOKENS = 100
 CHUNK_SIZE_CHARS = CHUNK_SIZE_TOKENS * CHARS_PER_TOKEN
+CHUNK_STRIDE_CHARS = CHUNK_STRIDE_TOKENS * CHARS_PER_TOKEN
 OVERLAP_CHARS = OVERLAP_TOKENS * CHARS_PER_TOKEN
 
+# Parsing parameters
+PARSE_WORKERS = os.cpu_count() or 1
+
 # Retrieval parameters
 TOP_K = 4
+SIMILARITY_BLOCK_ROWS = 4096
 
 # LLM parameters
 MAX_TOKENS = 1024
 TEMPERATURE = 0.1
 
+# User prompt; filled with the retrieved context and the question. Static text
+# and context come first and the question last, so requests retrieving the same
+# chunks share a long prompt prefix the LLM server can reuse from its KV cache.
+USER_PROMPT_TEMPLATE = """Kontext aus Schweizer Dokumenten:
+
+{context}
+
+Bitte beantworte die Frage basierend auf dem obigen Kontext.
+
+Frage: {question}"""
+
+# Example questions shown in the UI; their embeddings are precomputed at startup
+EXAMPLE_QUESTIONS = [
+    "Was sind die Grundrechte gemäss der Bundesverfassung?",
+    "Quels sont les droits fondamentaux selon la Constitution?",
+    "Was sind die Pflichten bei einer Datenschutzverletzung nach dem nDSG?"
+]
+
 # System prompt
 SYSTEM_PROMPT = """Du bist ein hilfreicher Assistent für Schweizer Rechtsdokumente und Vorschriften. Du antwortest präzise und sachlich basierend ausschliesslich auf dem bereitgestellten Kontext. Wenn die Antwort nicht im Kontext enthalten ist, sagst du das klar. Du kannst auf Deutsch, Französisch, Italienisch und Englisch antworten — antworte in der Sprache der Frage."""
 
@@ -69,7 +151,6 @@ class Chunk:
     source_label: str
     page_number: int
     chunk_index: int
-    embedding: Optional[np.ndarray] = None
 
 
 class DocumentProcessor:
@@ -77,76 +158,173 @@ class DocumentProcessor:
     
     def __init__(self):
         self.chunks: List[Chunk] = []
+        self.tokenizer = self.load_tokenizer()
+    
+    @staticmethod
+    def load_tokenizer() -> Optional[Tokenizer]:
+        """Load the embedding model's tokenizer for token-based chunking."""
+        try:
+            tokenizer = Tokenizer.from_pretrained(EMBEDDING_MODEL)
+            tokenizer.no_truncation()
+            tokenizer.no_padding()
+            return tokenizer
+        except Exception as e:
+            logger.warning(f"Failed to load tokenizer for {EMBEDDING_MODEL}, chunking by characters: {e}")
+            return None
         
     def download_pdf(self, url: str, label: str) -> Optional[bytes]:
-        """Download a PDF from a URL."""
+        """Download a PDF from a URL, revalidating a local copy with ETag/Last-Modified."""
+        cache_base = os.path.join(PDF_CACHE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest())
+        pdf_path, validators_path = f"{cache_base}.pdf", f"{cache_base}.json"
+        
+        headers = {}
+        if os.path.exists(pdf_path) and os.path.exists(validators_path):
+            try:
+                with open(validators_path) as f:
+                    validators = json.load(f)
+                if validators.get("etag"):
+                    headers["If-None-Match"] = validators["etag"]
+                if validators.get("last_modified"):
+                    headers["If-Modified-Since"] = validators["last_modified"]
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable cache metadata for {label}: {e}")
+        
         try:
             logger.info(f"Downloading {label} from {url}")
-            response = requests.get(url, timeout=60)
+            response = SESSION.get(url, headers=headers, timeout=60)
+            if response.status_code == 304:
+                logger.info(f"{label} not modified, using cached copy")
+                with open(pdf_path, "rb") as f:
+                    return f.read()
             response.raise_for_status()
-            return response.content
+            content = response.content
         except Exception as e:
+            if os.path.exists(pdf_path):
+                logger.warning(f"Failed to download {label}, using cached copy: {e}")
+                with open(pdf_path, "rb") as f:
+                    return f.read()
             logger.warning(f"Failed to download {label}: {e}")
             return None
+        
+        try:
+            os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+            with open(f"{pdf_path}.tmp", "wb") as f:
+                f.write(content)
+            with open(f"{validators_path}.tmp", "w") as f:
+                json.dump({
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }, f)
+            os.replace(f"{pdf_path}.tmp", pdf_path)
+            os.replace(f"{validators_path}.tmp", validators_path)
+        except Exception as e:
+            logger.warning(f"Failed to cache {label}: {e}")
+        return content
     
-    def parse_pdf(self, pdf_bytes: bytes, label: str) -> List[Tuple[str, int]]:
-        """Parse PDF and extract text with page numbers."""
+    @staticmethod
+    def parse_pdf(pdf_bytes: bytes, label: str, offset: int = 0, step: int = 1) -> List[Tuple[str, int]]:
+        """Parse every `step`-th PDF page from `offset` and extract text with page numbers."""
         pages = []
         try:
             doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            for page_num, page in enumerate(doc, start=1):
-                text = page.get_text()
+            for page_index in range(offset, doc.page_count, step):
+                # Text blocks only (block type 0); image blocks are skipped
+                blocks = doc[page_index].get_text("blocks")
+                text = "\n".join(block[4] for block in blocks if block[6] == 0)
                 if text.strip():
-                    pages.append((text, page_num))
+                    pages.append((text, page_index + 1))
             doc.close()
-            logger.info(f"Extracted {len(pages)} pages from {label}")
         except Exception as e:
             logger.warning(f"Failed to parse PDF {label}: {e}")
         return pages
     
     def chunk_text(self, text: str, page_num: int, label: str, start_chunk_index: int) -> List[Chunk]:
-        """Split text into overlapping chunks."""
-        chunks = []
-        start = 0
-        chunk_index = start_chunk_index
-        
-        while start < len(text):
-            end = start + CHUNK_SIZE_CHARS
-            chunk_text = text[start:end]
-            
-            if chunk_text.strip():
-                chunks.append(Chunk(
-                    text=chunk_text.strip(),
-                    source_label=label,
-                    page_number=page_num,
-                    chunk_index=chunk_index
-                ))
-                chunk_index += 1
-            
-            start += CHUNK_SIZE_CHARS - OVERLAP_CHARS
-            
-            # Avoid infinite loop
-            if start >= len(text):
-                break
+        """Split text into overlapping chunks of CHUNK_SIZE_TOKENS tokens.
         
-        return chunks
+        Windows are cut from the original text at token character offsets, so
+        casing and accents survive even though the tokenizer is uncased.
+        """
+        # A window is only started while the previous one has not yet reached the
+        # end of the text; otherwise it would lie entirely inside its predecessor
+        if self.tokenizer is None:
+            starts = range(0, max(len(text) - OVERLAP_CHARS, 1), CHUNK_STRIDE_CHARS)
+            windows = (text[start:start + CHUNK_SIZE_CHARS].strip() for start in starts)
+        else:
+            offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+            starts = range(0, max(len(offsets) - OVERLAP_TOKENS, 1), CHUNK_STRIDE_TOKENS)
+            windows = (
+                text[offsets[start][0]:offsets[min(start + CHUNK_SIZE_TOKENS, len(offsets)) - 1][1]].strip()
+                for start in starts
+            )
+        return [
+            Chunk(
+                text=chunk_text,
+                source_label=label,
+                page_number=page_num,
+                chunk_index=chunk_index
+            )
+            for chunk_index, chunk_text in enumerate(
+                (window for window in windows if window), start=start_chunk_index
+            )
+        ]
     
-    def process_documents(self, documents: List[Dict]) -> Dict[str, int]:
-        """Download and process all documents."""
+    def download_documents(self, documents: List[Dict]) -> Dict[str, Optional[bytes]]:
+        """Download all documents concurrently, keyed by label."""
+        with ThreadPoolExecutor(max_workers=len(documents) or 1) as executor:
+            return dict(zip(
+                [doc_config["label"] for doc_config in documents],
+                executor.map(
+                    lambda doc_config: self.download_pdf(doc_config["url"], doc_config["label"]),
+                    documents
+                )
+            ))
+    
+    def process_documents(self, documents: List[Dict],
+                          downloads: Optional[Dict[str, Optional[bytes]]] = None) -> Dict[str, int]:
+        """Download and process all documents.
+        
+        Downloads run concurrently in threads (unless already provided) and
+        parsing runs concurrently in worker processes; chunking is cheap and
+        done serially afterwards.
+        """
         stats = {}
+        labels = [doc_config["label"] for doc_config in documents]
         
-        for doc_config in documents:
-            url = doc_config["url"]
-            label = doc_config["label"]
-            
-            # Download PDF
-            pdf_bytes = self.download_pdf(url, label)
-            if not pdf_bytes:
-                stats[label] = 0
-                continue
+        # Download PDFs
+        if downloads is None:
+            downloads = self.download_documents(documents)
+        
+        # Parse PDFs in interleaved page slices so large documents are spread
+        # across workers. Each worker receives the PDF bytes once via the pool
+        # initializer and opens its own document, since PyMuPDF is not thread-safe
+        to_parse = {label: downloads[label] for label in labels if downloads.get(label)}
+        parsed: Dict[str, List[Tuple[str, int]]] = {}
+        if to_parse:
+            with ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                initializer=_init_parse_worker,
+                initargs=(to_parse,)
+            ) as executor:
+                futures = [
+                    (label, executor.submit(_parse_pdf_slice, label, offset, PARSE_WORKERS))
+                    for label in to_parse
+                    for offset in range(PARSE_WORKERS)
+                ]
+                for label, future in futures:
+                    try:
+                        parsed.setdefault(label, []).extend(future.result())
+                    except Exception as e:
+                        logger.warning(f"Failed to parse PDF {label}: {e}")
             
-            # Parse PDF
-            pages = self.parse_pdf(pdf_bytes, label)
+            # Slices interleave pages; restore page order
+            for pages in parsed.values():
+                pages.sort(key=lambda page: page[1])
+        
+        for label, pages in parsed.items():
+            logger.info(f"Extracted {len(pages)} pages from {label}")
+        
+        for label in labels:
+            pages = parsed.get(label)
             if not pages:
                 stats[label] = 0
                 continue
@@ -166,6 +344,96 @@ class DocumentProcessor:
         return stats
 
 
+# PDF bytes by label inside parse worker processes, set once per worker
+_parse_downloads: Dict[str, bytes] = {}
+
+
+def _init_parse_worker(downloads: Dict[str, bytes]):
+    """Process pool initializer: keep the downloaded PDFs for this worker."""
+    _parse_downloads.update(downloads)
+
+
+def _parse_pdf_slice(label: str, offset: int, step: int) -> List[Tuple[str, int]]:
+    """Parse one page slice of a PDF held by this worker."""
+    return DocumentProcessor.parse_pdf(_parse_downloads[label], label, offset, step)
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting the rate of outgoing API requests."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding requests into batched calls.
+    
+    A background thread waits for the first request, collects whatever else
+    arrives within `max_wait_ms` (up to `max_batch_size` texts), embeds them
+    with one call to `embed_batch` and resolves each caller's future. The
+    thread is started on the first submit, so no extra thread exists while
+    documents are parsed in forked worker processes.
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], Optional[np.ndarray]],
+                 max_batch_size: int = QUERY_BATCH_MAX_SIZE, max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.thread_lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text; the future resolves to its embedding or None."""
+        if self.thread is None:
+            with self.thread_lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self.thread.start()
+        future: Future = Future()
+        self.queue.put((text, future))
+        return future
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(items) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                embeddings = self.embed_batch([text for text, _ in items])
+            except Exception as e:
+                logger.warning(f"Failed to embed batch of {len(items)} queries: {e}")
+                embeddings = None
+            for i, (_, future) in enumerate(items):
+                future.set_result(None if embeddings is None else embeddings[i])
+
+
 class EmbeddingEngine:
     """Handles embedding generation using HuggingFace Inference API.
 
@@ -174,88 +442,221 @@ class EmbeddingEngine:
     HF API token is required. Chunking/parsing happens locally.
     """
 
+    # Upper bound on texts sent in a single feature-extraction request
+    MAX_BATCH_SIZE = 32
+
     def __init__(self, token: str):
-        self.client = InferenceClient(token=token)
         self.model = EMBEDDING_MODEL
+        self.url = HF_FEATURE_EXTRACTION_URL.format(model=self.model)
+        self.headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        # Persistent cache of float16 vectors, survives restarts
+        self.cache = diskcache.Cache(EMBEDDING_CACHE_DIR)
+        # In-memory memo for repeated texts and queries within a session
+        self._embed_text_cached = lru_cache(maxsize=EMBEDDING_MEMO_SIZE)(self._embed_text)
+        self.rate_limiter = RateLimiter(EMBEDDING_REQUESTS_PER_SECOND, burst=EMBEDDING_WORKERS)
+        # Coalesces concurrent query embeddings into shared API requests
+        self.batcher = EmbeddingBatcher(self.embed_texts)
+    
+    def _cache_key(self, text: str) -> str:
+        """Content-addressed cache key for a text under the current model."""
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+    
+    def _request_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of texts with one HF Inference API request."""
+        self.rate_limiter.acquire()
+        response = SESSION.post(
+            self.url,
+            headers=self.headers,
+            data=orjson.dumps({"inputs": texts, "options": {"wait_for_model": True}}),
+            timeout=60
+        )
+        response.raise_for_status()
+        embeddings = np.asarray(orjson.loads(response.content), dtype=np.float32)
         
-    def embed_text(self, text: str) -> Optional[np.ndarray]:
-        """Embed a single text using HF Inference API."""
+        # Token-level output (B, T, D) is averaged to one vector per text
+        if embeddings.ndim == 3:
+            embeddings = embeddings.mean(axis=1)
+        embeddings = embeddings.reshape(len(texts), -1)
+        
+        # Normalize
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8
+        return embeddings
+    
+    def _cached_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Look up a text's embedding in the persistent cache."""
+        cached = self.cache.get(self._cache_key(text))
+        if cached is None:
+            return None
+        return np.frombuffer(cached, dtype=np.float16).astype(np.float32)
+    
+    def embed_texts(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Embed texts as a (len(texts), D) matrix, requesting only cache misses."""
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        # Identical texts (e.g. repeated page headers) are requested once
+        misses: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            embeddings[i] = self._cached_embedding(text)
+            if embeddings[i] is None:
+                misses.setdefault(text, []).append(i)
+        
+        miss_texts = list(misses)
         try:
-            result = self.client.feature_extraction(text, model=self.model)
-            
-            # Handle different response formats
-            if isinstance(result, list):
-                # If nested list, flatten by averaging
-                if isinstance(result[0], list):
-                    embedding = np.mean(result, axis=0)
-                else:
-                    embedding = np.array(result)
-            else:
-                embedding = np.array(result)
-            
-            # Normalize
-            embedding = embedding / (np.linalg.norm(embedding) + 1e-8)
-            return embedding
-            
+            for start in range(0, len(miss_texts), self.MAX_BATCH_SIZE):
+                batch = miss_texts[start:start + self.MAX_BATCH_SIZE]
+                batch_embeddings = self._request_embeddings(batch)
+                for text, embedding in zip(batch, batch_embeddings):
+                    self.cache[self._cache_key(text)] = embedding.astype(np.float16).tobytes()
+                    for i in misses[text]:
+                        embeddings[i] = embedding
         except Exception as e:
-            logger.warning(f"Failed to embed text: {e}")
+            logger.warning(f"Failed to embed {len(miss_texts)} texts: {e}")
             return None
+        
+        return np.vstack(embeddings) if embeddings else None
     
-    def embed_chunks_batch(self, chunks: List[Chunk], batch_size: int = 10) -> int:
-        """Embed chunks in batches with rate limiting."""
-        success_count = 0
+    def _embed_text(self, text: str) -> np.ndarray:
+        """Embed a single text, raising on failure so errors are not memoized.
+        
+        Cache hits return immediately; misses go through the micro-batcher so
+        concurrent queries share one API request.
+        """
+        embedding = self._cached_embedding(text)
+        if embedding is None:
+            embedding = self.batcher.submit(text).result()
+        if embedding is None:
+            raise RuntimeError("Text embedding failed")
+        # Memoized arrays are shared between callers
+        embedding.setflags(write=False)
+        return embedding
+        
+    def embed_text(self, text: str) -> Optional[np.ndarray]:
+        """Embed a single text using HF Inference API, memoized per session."""
+        try:
+            return self._embed_text_cached(text)
+        except RuntimeError:
+            return None
+    
+    def _embed_one_batch(self, texts: List[str], out: np.ndarray) -> bool:
+        """Embed one batch of texts into the rows of `out`."""
+        embeddings = self.embed_texts(texts)
+        if embeddings is None:
+            return False
+        if embeddings.shape != out.shape:
+            logger.warning(f"Unexpected embedding shape {embeddings.shape}, expected {out.shape}")
+            return False
+        out[:] = embeddings
+        return True
+    
+    def embed_chunks_batch(self, chunks: List[Chunk], embeddings: np.ndarray,
+                           batch_size: int = MAX_BATCH_SIZE) -> np.ndarray:
+        """Embed chunks into a preallocated (len(chunks), EMBEDDING_DIM) matrix.
+        
+        Batches are embedded concurrently behind the rate limiter, each writing
+        its own slice of `embeddings` in place. Returns a boolean mask of the
+        rows that were embedded successfully.
+        """
+        batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
         total = len(chunks)
+        num_batches = (total + batch_size - 1) // batch_size
+        embedded = np.zeros(total, dtype=bool)
         
-        for i in range(0, total, batch_size):
-            batch = chunks[i:i+batch_size]
-            logger.info(f"Embedding batch {i//batch_size + 1}/{(total + batch_size - 1)//batch_size}")
-            
-            for chunk in batch:
-                embedding = self.embed_text(chunk.text)
-                if embedding is not None:
-                    chunk.embedding = embedding
-                    success_count += 1
-            
-            # Rate limiting
-            if i + batch_size < total:
-                time.sleep(0.5)
+        with ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    self._embed_one_batch,
+                    [chunk.text for chunk in chunks[i:i+batch_size]],
+                    embeddings[i:i+batch_size]
+                ): i
+                for i in range(0, total, batch_size)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                if future.result():
+                    embedded[i:i+batch_size] = True
+                logger.info(f"Embedded batch {done}/{num_batches}")
         
-        return success_count
+        return embedded
 
 
 class RAGRetriever:
-    """Handles retrieval of relevant chunks using cosine similarity."""
+    """Handles retrieval of relevant chunks using cosine similarity.
+    
+    Chunk metadata and embeddings are kept as parallel structures: row i of
+    the `embeddings` matrix belongs to `chunks[i]`. Embeddings are stored as
+    int8 with a per-row scale, a quarter of the float32 footprint.
+    """
     
-    def __init__(self, chunks: List[Chunk], embedding_engine: EmbeddingEngine):
-        self.chunks = [c for c in chunks if c.embedding is not None]
+    def __init__(self, chunks: List[Chunk], embeddings: np.ndarray, embedding_engine: EmbeddingEngine,
+                 scales: Optional[np.ndarray] = None):
+        self.chunks = chunks
         self.embedding_engine = embedding_engine
-        
-        if self.chunks:
-            self.embeddings = np.vstack([c.embedding for c in self.chunks])
+        if scales is None:
+            self.embeddings, self.scales = self.quantize(embeddings)
         else:
-            self.embeddings = np.array([])
+            # Already quantized, e.g. loaded from an index snapshot
+            self.embeddings, self.scales = embeddings, scales
+        self.use_simsimd = simsimd is not None
+    
+    @staticmethod
+    def quantize(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Quantize L2-normalized rows to int8 with a symmetric per-row scale."""
+        embeddings = embeddings.astype(np.float32, copy=False)
+        embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+        scales = 127.0 / np.maximum(np.abs(embeddings).max(axis=1), 1e-8)
+        quantized = np.round(embeddings * scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    
+    def _similarities(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query against every chunk."""
+        query = query_embedding.astype(np.float32)
+        
+        if self.use_simsimd and self.chunks:
+            try:
+                # int8 cosine kernel on the quantized rows; scales cancel out
+                query_q = np.round(query * (127.0 / max(np.abs(query).max(), 1e-8))).astype(np.int8)
+                distances = simsimd.cdist(query_q[None, :], self.embeddings, metric="cosine")
+                return 1.0 - np.asarray(distances, dtype=np.float32)[0]
+            except Exception as e:
+                logger.warning(f"SimSIMD similarity failed, falling back to NumPy: {e}")
+                self.use_simsimd = False
+        
+        similarities = np.empty(len(self.chunks), dtype=np.float32)
+        
+        # Dequantize block by block so the float32 temporary stays small
+        for start in range(0, similarities.size, SIMILARITY_BLOCK_ROWS):
+            block = self.embeddings[start:start + SIMILARITY_BLOCK_ROWS].astype(np.float32)
+            similarities[start:start + SIMILARITY_BLOCK_ROWS] = block @ query
+        
+        similarities /= self.scales
+        return similarities
     
-    def retrieve(self, query: str, top_k: int = TOP_K) -> List[Tuple[Chunk, float]]:
+    def retrieve(self, query: str, top_k: int = TOP_K,
+                 precomputed_query_emb: Optional[np.ndarray] = None) -> List[Tuple[Chunk, float]]:
         """Retrieve top-k most relevant chunks."""
         if len(self.chunks) == 0:
             return []
         
-        # Embed query
-        query_embedding = self.embedding_engine.embed_text(query)
+        # Embed query, unless its embedding is already known
+        if precomputed_query_emb is not None:
+            query_embedding = precomputed_query_emb
+        else:
+            query_embedding = self.embedding_engine.embed_text(query)
         if query_embedding is None:
             return []
         
-        # Compute cosine similarities
-        similarities = []
-        for i, chunk_embedding in enumerate(self.embeddings):
-            # scipy cosine returns distance, so similarity = 1 - distance
-            similarity = 1 - cosine(query_embedding, chunk_embedding)
-            similarities.append((self.chunks[i], similarity))
+        similarities = self._similarities(query_embedding)
         
-        # Sort by similarity (descending)
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        # Select top-k in O(N) without sorting the whole array, then order by similarity (descending)
+        k = min(top_k, similarities.size)
+        if k <= 0:
+            return []
+        if k < similarities.size:
+            top_idx = np.argpartition(-similarities, k - 1)[:k]
+        else:
+            top_idx = np.arange(similarities.size)
+        top_idx = top_idx[np.argsort(-similarities[top_idx])]
         
-        return similarities[:top_k]
+        return [(self.chunks[i], float(similarities[i])) for i in top_idx]
 
 
 class SwissRAG:
@@ -283,13 +684,26 @@ class SwissRAG:
         self.embedding_engine = EmbeddingEngine(self.hf_token)
         self.retriever = None
         self.doc_stats = {}
+        # LRU of completed answers keyed by normalized question
+        self._answer_cache: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._answer_cache_lock = threading.Lock()
+        # Embeddings of the UI example questions, keyed by question
+        self._query_emb_cache: Dict[str, np.ndarray] = {}
         
     def initialize(self):
         """Initialize the RAG system by loading and processing documents."""
+        # Download (or revalidate cached) PDFs; their content keys the snapshot
+        downloads = self.doc_processor.download_documents(DOCUMENTS)
+        
+        if self._load_index(downloads):
+            self._embed_example_questions()
+            logger.info("RAG system ready (loaded index snapshot)!")
+            return self.get_status_message()
+        
         logger.info("Starting document ingestion...")
         
         # Process documents
-        self.doc_stats = self.doc_processor.process_documents(DOCUMENTS)
+        self.doc_stats = self.doc_processor.process_documents(DOCUMENTS, downloads)
         total_chunks = len(self.doc_processor.chunks)
         logger.info(f"Total chunks created: {total_chunks}")
         
@@ -298,15 +712,102 @@ class SwissRAG:
         
         # Embed chunks
         logger.info("Embedding chunks...")
-        success_count = self.embedding_engine.embed_chunks_batch(self.doc_processor.chunks)
-        logger.info(f"Successfully embedded {success_count}/{total_chunks} chunks")
+        chunks = self.doc_processor.chunks
+        embeddings = np.empty((total_chunks, EMBEDDING_DIM), dtype=np.float32)
+        embedded = self.embedding_engine.embed_chunks_batch(chunks, embeddings)
+        logger.info(f"Successfully embedded {int(embedded.sum())}/{total_chunks} chunks")
+        
+        # Drop chunks whose batch failed to embed
+        if not embedded.all():
+            chunks = [chunk for chunk, ok in zip(chunks, embedded) if ok]
+            embeddings = embeddings[embedded]
         
         # Initialize retriever
-        self.retriever = RAGRetriever(self.doc_processor.chunks, self.embedding_engine)
+        self.retriever = RAGRetriever(chunks, embeddings, self.embedding_engine)
+        
+        # Only snapshot complete indexes so failed batches are retried next start
+        if embedded.all():
+            self._save_index(downloads)
+        self._embed_example_questions()
         logger.info("RAG system ready!")
         
         return self.get_status_message()
     
+    def _embed_example_questions(self):
+        """Embed the UI example questions so their first click skips the API."""
+        embeddings = self.embedding_engine.embed_texts(EXAMPLE_QUESTIONS)
+        if embeddings is None:
+            logger.warning("Failed to precompute example question embeddings")
+            return
+        self._query_emb_cache = dict(zip(EXAMPLE_QUESTIONS, embeddings))
+    
+    def _index_paths(self, downloads: Dict[str, Optional[bytes]]) -> Tuple[str, str]:
+        """Snapshot paths for the current document contents and chunking setup."""
+        config = {
+            "index_format_version": INDEX_FORMAT_VERSION,
+            "documents": DOCUMENTS,
+            "document_sha256": {
+                label: hashlib.sha256(pdf_bytes).hexdigest() if pdf_bytes else None
+                for label, pdf_bytes in downloads.items()
+            },
+            "embedding_model": EMBEDDING_MODEL,
+            "chunk_size_tokens": CHUNK_SIZE_TOKENS,
+            "overlap_tokens": OVERLAP_TOKENS,
+            "tokenized": self.doc_processor.tokenizer is not None,
+        }
+        fingerprint = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+        base = os.path.join(INDEX_CACHE_DIR, fingerprint)
+        return f"{base}.npy", f"{base}.pkl"
+    
+    def _save_index(self, downloads: Dict[str, Optional[bytes]]):
+        """Write the quantized embeddings and chunk metadata to disk."""
+        npy_path, pkl_path = self._index_paths(downloads)
+        try:
+            os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+            with open(f"{npy_path}.tmp", "wb") as f:
+                np.save(f, self.retriever.embeddings)
+            with open(f"{pkl_path}.tmp", "wb") as f:
+                pickle.dump({
+                    "chunks": self.retriever.chunks,
+                    "scales": self.retriever.scales,
+                    "doc_stats": self.doc_stats,
+                }, f)
+            # The metadata file is moved last, so its presence marks a complete snapshot
+            os.replace(f"{npy_path}.tmp", npy_path)
+            os.replace(f"{pkl_path}.tmp", pkl_path)
+            logger.info(f"Saved index snapshot to {npy_path}")
+        except Exception as e:
+            logger.warning(f"Failed to save index snapshot: {e}")
+            return
+        
+        # Snapshots for older document contents or settings can never match again
+        for name in os.listdir(INDEX_CACHE_DIR):
+            path = os.path.join(INDEX_CACHE_DIR, name)
+            if name.endswith((".npy", ".pkl")) and path not in (npy_path, pkl_path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Failed to remove stale index snapshot {path}: {e}")
+    
+    def _load_index(self, downloads: Dict[str, Optional[bytes]]) -> bool:
+        """Load a matching index snapshot, memory-mapping the embeddings."""
+        npy_path, pkl_path = self._index_paths(downloads)
+        if not (os.path.exists(npy_path) and os.path.exists(pkl_path)):
+            return False
+        try:
+            with open(pkl_path, "rb") as f:
+                metadata = pickle.load(f)
+            embeddings = np.load(npy_path, mmap_mode="r")
+            self.retriever = RAGRetriever(
+                metadata["chunks"], embeddings, self.embedding_engine, scales=metadata["scales"]
+            )
+            self.doc_stats = metadata["doc_stats"]
+            logger.info(f"Loaded index snapshot with {len(self.retriever.chunks)} chunks from {npy_path}")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to load index snapshot: {e}")
+            return False
+    
     def get_status_message(self) -> str:
         """Get status message for UI."""
         if not self.retriever:
@@ -331,32 +832,49 @@ class SwissRAG:
         
         return "\n".join(info)
     
-    def query(self, question: str) -> Tuple[str, str]:
-        """Process a query and return answer with retrieved context."""
+    def query(self, question: str) -> Iterator[Tuple[str, str]]:
+        """Process a query, yielding the partial answer as it streams with retrieved context."""
         if not self.retriever:
-            return "Error: System not initialized", ""
+            yield "Error: System not initialized", ""
+            return
         
         if not question.strip():
-            return "Please enter a question.", ""
+            yield "Please enter a question.", ""
+            return
+        
+        # Repeated questions (e.g. re-clicked examples) are served from cache
+        question = " ".join(question.split())
+        with self._answer_cache_lock:
+            cached = self._answer_cache.get(question)
+            if cached is not None:
+                self._answer_cache.move_to_end(question)
+        if cached is not None:
+            yield cached
+            return
         
         # Retrieve relevant chunks
-        retrieved = self.retriever.retrieve(question, top_k=TOP_K)
+        retrieved = self.retriever.retrieve(
+            question, top_k=TOP_K, precomputed_query_emb=self._query_emb_cache.get(question)
+        )
         
         if not retrieved:
-            return "Error: Could not retrieve relevant context.", ""
+            yield "Error: Could not retrieve relevant context.", ""
+            return
         
-        # Format context
+        # Order chunks by document position rather than similarity, so the same
+        # chunks always produce the same prompt prefix
+        retrieved = sorted(
+            retrieved,
+            key=lambda item: (item[0].source_label, item[0].page_number, item[0].chunk_index)
+        )
+        
+        # Format LLM context and UI display in a single pass, with matching numbers
         context_parts = []
+        retrieved_display = []
         for i, (chunk, score) in enumerate(retrieved, 1):
             context_parts.append(
                 f"[{i}] {chunk.source_label} (Seite/Page {chunk.page_number}):\n{chunk.text}"
             )
-        
-        context_str = "\n\n".join(context_parts)
-        
-        # Format retrieved context for display
-        retrieved_display = []
-        for i, (chunk, score) in enumerate(retrieved, 1):
             retrieved_display.append(
                 f"**Chunk {i}** (Similarity: {score:.3f})\n"
                 f"Source: {chunk.source_label} | Page: {chunk.page_number}\n"
@@ -365,13 +883,10 @@ class SwissRAG:
         retrieved_info = "\n\n".join(retrieved_display)
         
         # Create prompt
-        user_prompt = f"""Kontext aus Schweizer Dokumenten:
-
-{context_str}
-
-Frage: {question}
-
-Bitte beantworte die Frage basierend auf dem obigen Kontext."""
+        user_prompt = USER_PROMPT_TEMPLATE.format_map({
+            "context": "\n\n".join(context_parts),
+            "question": question,
+        })
         
         # Call LLM via PublicAI
         try:
@@ -380,21 +895,43 @@ Bitte beantworte die Frage basierend auf dem obigen Kontext."""
                 {"role": "user", "content": user_prompt}
             ]
 
-            response = self.llm_client.chat.completions.create(
+            stream = self.llm_client.chat.completions.create(
                 model=self.llm_model,
                 messages=messages,
                 max_tokens=MAX_TOKENS,
-                temperature=TEMPERATURE
+                temperature=TEMPERATURE,
+                stream=True
             )
 
-            answer = response.choices[0].message.content
-            logger.info(f"LLM response received from {self.llm_model}")
+            answer = ""
+            finish_reason = None
+            for part in stream:
+                if not part.choices:
+                    continue
+                finish_reason = part.choices[0].finish_reason or finish_reason
+                delta = part.choices[0].delta.content or ""
+                if delta:
+                    answer += delta
+                    yield answer, retrieved_info
+            logger.info(f"LLM response received from {self.llm_model} (finish_reason={finish_reason})")
 
         except Exception as e:
             logger.error(f"LLM call failed with {self.llm_model}: {e}")
-            answer = f"Error: LLM call failed: {str(e)}"
+            yield f"Error: LLM call failed: {str(e)}", retrieved_info
+            return
+
+        if not answer:
+            yield answer, retrieved_info
+            return
 
-        return answer, retrieved_info
+        # Only answers the model finished on its own are cached; e.g. ones cut
+        # off at MAX_TOKENS ("length") are not
+        if finish_reason != "stop":
+            return
+        with self._answer_cache_lock:
+            self._answer_cache[question] = (answer, retrieved_info)
+            if len(self._answer_cache) > ANSWER_CACHE_SIZE:
+                self._answer_cache.popitem(last=False)
 
 
 def create_ui(rag_system: SwissRAG) -> gr.Blocks:
@@ -422,11 +959,7 @@ def create_ui(rag_system: SwissRAG) -> gr.Blocks:
                 ask_button = gr.Button("Ask / Fragen", variant="primary")
                 
                 gr.Examples(
-                    examples=[
-                        "Was sind die Grundrechte gemäss der Bundesverfassung?",
-                        "Quels sont les droits fondamentaux selon la Constitution?",
-                        "Was sind die Pflichten bei einer Datenschutzverletzung nach dem nDSG?"
-                    ],
+                    examples=EXAMPLE_QUESTIONS,
                     inputs=question_box,
                     label="Example Questions / Beispielfragen"
                 )
@@ -447,8 +980,9 @@ def create_ui(rag_system: SwissRAG) -> gr.Blocks:
         
         # Event handlers
         def handle_query(question):
-            answer, context = rag_system.query(question)
-            return answer, context, rag_system.get_status_message()
+            # Generator handler: Gradio streams each partial answer to the UI
+            for answer, context in rag_system.query(question):
+                yield answer, context, rag_system.get_status_message()
         
         ask_button.click(
             fn=handle_query,
@@ -475,6 +1009,7 @@ def main():
         
         # Create and launch UI
         demo = create_ui(rag)
+        demo.queue(default_concurrency_limit=UI_CONCURRENCY_LIMIT)
         demo.launch()
         
     except ValueError as e:
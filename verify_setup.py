@@ -18,11 +18,12 @@ def check_imports():
     """Check all required imports."""
     required = {
         'gradio': 'gradio',
-        'huggingface_hub': 'huggingface_hub',
         'numpy': 'numpy',
-        'scipy': 'scipy',
         'fitz': 'pymupdf',
-        'requests': 'requests'
+        'requests': 'requests',
+        'orjson': 'orjson',
+        'diskcache': 'diskcache',
+        'tokenizers': 'tokenizers'
     }
     
     all_ok = True
@@ -39,6 +40,18 @@ def check_imports():
             print(f"✗ {package}: NOT INSTALLED")
             all_ok = False
     
+    # Optional packages: the app falls back gracefully without them
+    optional = {
+        'simsimd': 'simsimd (optional, NumPy fallback)'
+    }
+    for module, package in optional.items():
+        try:
+            mod = __import__(module)
+            version = getattr(mod, '__version__', 'unknown')
+            print(f"✓ {package}: {version}")
+        except ImportError:
+            print(f"- {package}: not installed")
+    
     return all_ok
 
 def check_env_var():